@@ -0,0 +1,283 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# Streaming aggregation of decoded samples.
+#
+# Feed the dicts returned by ELM327.fetchLiveData() (or the Samples from
+# fetchSamples()) into an Aggregator and it keeps rolling statistics for each
+# PID over a time window, plus any derived signals (fuel economy etc.) - so
+# callers don't need to keep their own history lists and recompute over them
+# every time.
+
+import time, bisect, numbers
+from collections import deque
+
+class RollingWindow(object):
+	"""
+	Rolling statistics over the last 'window' seconds of a single signal.
+
+	Mean, min and max are O(1) amortised per sample (running sum and
+	monotonic queues). Percentiles are not: they keep a sorted copy of the
+	window, so each sample costs a bisect plus an O(n) memmove in and out.
+	That's deliberate - for the few thousand samples in a window, moving a
+	block of pointers in C beats any balanced tree written in Python.
+	"""
+
+	def __init__(self, window=60.0):
+		self.window = window
+		self.__samples = deque() # (timestamp, value), oldest first
+		self.__sum = 0.0
+		self.__mins = deque() # increasing values, candidates for min
+		self.__maxs = deque() # decreasing values, candidates for max
+		self.__sorted = []
+
+	def add(self, value, t=None):
+		"""
+		Add a value to the window. If t (seconds) isn't given, now is used.
+		"""
+		if t == None:
+			t = time.time()
+
+		self.__samples.append((t, value))
+		self.__sum += value
+		bisect.insort(self.__sorted, value)
+
+		while self.__mins and self.__mins[-1][1] > value:
+			self.__mins.pop()
+		self.__mins.append((t, value))
+
+		while self.__maxs and self.__maxs[-1][1] < value:
+			self.__maxs.pop()
+		self.__maxs.append((t, value))
+
+		self.expire(t)
+
+	def expire(self, now=None):
+		"""
+		Drop samples older than the window. add() does this for you, but call
+		it if you're reading stats from a signal that has stopped updating.
+		"""
+		if now == None:
+			now = time.time()
+		cutoff = now - self.window
+
+		while self.__samples and self.__samples[0][0] < cutoff:
+			t, value = self.__samples.popleft()
+			self.__sum -= value
+			del self.__sorted[bisect.bisect_left(self.__sorted, value)]
+
+		while self.__mins and self.__mins[0][0] < cutoff:
+			self.__mins.popleft()
+		while self.__maxs and self.__maxs[0][0] < cutoff:
+			self.__maxs.popleft()
+
+	def __len__(self):
+		return len(self.__samples)
+
+	@property
+	def count(self):
+		return len(self.__samples)
+
+	@property
+	def last(self):
+		if not self.__samples:
+			return None
+		return self.__samples[-1][1]
+
+	@property
+	def mean(self):
+		if not self.__samples:
+			return None
+		return self.__sum / len(self.__samples)
+
+	@property
+	def min(self):
+		if not self.__mins:
+			return None
+		return self.__mins[0][1]
+
+	@property
+	def max(self):
+		if not self.__maxs:
+			return None
+		return self.__maxs[0][1]
+
+	def percentile(self, p):
+		"""
+		Return the p'th percentile (0-100) of the window, nearest-rank.
+		"""
+		n = len(self.__sorted)
+		if n == 0:
+			return None
+		rank = int(round(p / 100.0 * (n - 1)))
+		return self.__sorted[max(0, min(n - 1, rank))]
+
+class FuelEconomy(object):
+	"""
+	Derived signal: fuel consumption from MAF (0x10) and vehicle speed (0x0D).
+
+	Fuel flow is estimated from mass air flow assuming stoichiometric
+	combustion, which is about right for a petrol engine in closed loop. For
+	diesel or ethanol blends, pass a different afr and density.
+	"""
+
+	pids = (0x0D, 0x10)
+
+	def __init__(self, afr=14.7, density=737.0):
+		self.afr = afr # air/fuel ratio, by mass
+		self.density = density # grams of fuel per litre
+		self.speed = None # km/h
+		self.rate = None # litres/hour
+		self.fuel = 0.0 # litres used this trip
+		self.distance = 0.0 # km travelled this trip
+		self.__last = None
+
+	def feed(self, pid, value, t):
+		# integrate using the values that held since the last sample
+		if self.__last != None:
+			dt = t - self.__last
+			if dt > 0:
+				if self.rate != None:
+					self.fuel += self.rate * dt / 3600.0
+				if self.speed != None:
+					self.distance += self.speed * dt / 3600.0
+		self.__last = t
+
+		if pid == 0x10:
+			self.rate = value / self.afr / self.density * 3600.0
+		elif pid == 0x0D:
+			self.speed = value
+
+	@property
+	def instant(self):
+		"""
+		Instantaneous fuel economy in L/100km, or None if stationary.
+		"""
+		if self.rate == None or not self.speed:
+			return None
+		return self.rate / self.speed * 100.0
+
+	@property
+	def trip(self):
+		"""
+		Fuel economy over the whole trip in L/100km, or None if we haven't
+		gone anywhere yet.
+		"""
+		if self.distance <= 0:
+			return None
+		return self.fuel / self.distance * 100.0
+
+	def reset(self):
+		self.fuel = 0.0
+		self.distance = 0.0
+
+class LoadTime(object):
+	"""
+	Derived signal: engine running time weighted by calculated load (0x04).
+
+	One second at 100% load counts as one second; one second at idle (~20%)
+	counts as a fifth. Useful for service intervals.
+	"""
+
+	pids = (0x04,)
+
+	def __init__(self):
+		self.load = None # %
+		self.seconds = 0.0
+		self.__last = None
+
+	def feed(self, pid, value, t):
+		if self.__last != None and self.load != None and t > self.__last:
+			self.seconds += (t - self.__last) * self.load / 100.0
+		self.__last = t
+		self.load = value
+
+	def reset(self):
+		self.seconds = 0.0
+
+class Aggregator(object):
+	"""
+	Keeps a RollingWindow per PID, and feeds derived signals.
+
+	Usage:
+
+		agg = Aggregator(window=30, derived=[FuelEconomy()])
+		while True:
+			agg.feed(elm.fetchLiveData(0x10))
+			agg.feed(elm.fetchLiveData(0x0D))
+			print agg.stats(0x0D), agg.derived[0].instant
+	"""
+
+	def __init__(self, window=60.0, derived=None):
+		self.window = window
+		self.windows = dict()
+		self.derived = list(derived or [])
+		self.__interested = dict()
+		for d in self.derived:
+			for pid in d.pids:
+				self.__interested.setdefault(pid, []).append(d)
+
+	def feed(self, sample, t=None):
+		"""
+		Add a sample, either a dictionary from fetchLiveData() or a
+		samples.Sample from fetchSample()/fetchSamples() - which carries its
+		own timestamp, used unless t is given. Values that aren't numeric
+		('NO DATA', decoded status strings) are ignored.
+		"""
+		if isinstance(sample, dict):
+			self.add(sample['pid'], sample['value'], t)
+		else:
+			self.add(sample.pid, sample.value, sample.time if t == None else t)
+
+	def add(self, pid, value, t=None):
+		"""
+		Add a raw value for a PID.
+		"""
+		if not isinstance(value, numbers.Real):
+			return
+		if t == None:
+			t = time.time()
+
+		w = self.windows.get(pid)
+		if w == None:
+			w = self.windows[pid] = RollingWindow(self.window)
+		w.add(value, t)
+
+		for d in self.__interested.get(pid, ()):
+			d.feed(pid, value, t)
+
+	def stats(self, pid, now=None):
+		"""
+		Return a dict of count, last, mean, min and max for a PID, or None if
+		we haven't seen it.
+
+		Samples older than the window are dropped first, so a PID that has
+		stopped updating (or only returns 'NO DATA') empties out rather than
+		showing stale figures. Pass now if the samples were fed with their
+		own timestamps, e.g. when replaying a log.
+		"""
+		w = self.windows.get(pid)
+		if w == None:
+			return None
+		w.expire(now)
+		return {'count': w.count,
+				'last': w.last,
+				'mean': w.mean,
+				'min': w.min,
+				'max': w.max}
+
+	def percentile(self, pid, p, now=None):
+		"""
+		Return the p'th percentile (0-100) of a PID over the window, or None
+		if there's nothing in it. Expires old samples first, like stats().
+		"""
+		w = self.windows.get(pid)
+		if w == None:
+			return None
+		w.expire(now)
+		return w.percentile(p)
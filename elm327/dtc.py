@@ -0,0 +1,149 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# Decoding of Diagnostic Trouble Codes (Modes 03, 07 and 0A) and the MIL and
+# readiness status (Mode 01 PID 01).
+
+from collections import namedtuple
+
+class DTCStatus(namedtuple('DTCStatus', 'mil count ignition readiness')):
+	"""
+	MIL and DTC count from Mode 01 PID 01.
+
+	mil is True if the Check Engine light is on, count is the number of stored
+	DTCs, ignition is 'spark' or 'compression', and readiness is a dictionary
+	of monitor name -> (supported, complete).
+	"""
+	__slots__ = ()
+
+class DTCReport(namedtuple('DTCReport', 'status stored pending permanent')):
+	"""
+	Result of ELM327.fetchAllDTCs(). status is a DTCStatus, the rest are lists
+	of DTC strings like 'P0133' from Modes 03, 07 and 0A respectively.
+	"""
+	__slots__ = ()
+
+__continuous = [
+	'Misfire',
+	'Fuel System',
+	'Components',
+]
+
+__spark = [
+	'Catalyst',
+	'Heated Catalyst',
+	'Evaporative System',
+	'Secondary Air System',
+	'A/C Refrigerant',
+	'Oxygen Sensor',
+	'Oxygen Sensor Heater',
+	'EGR System',
+]
+
+__compression = [
+	'NMHC Catalyst',
+	'NOx/SCR Monitor',
+	None, # reserved
+	'Boost Pressure',
+	None, # reserved
+	'Exhaust Gas Sensor',
+	'PM Filter Monitoring',
+	'EGR and/or VVT System',
+]
+
+def decodeDTC(a, b):
+	"""
+	Decode a two-byte DTC into the usual form, e.g. 0x01 0x33 -> 'P0133'.
+
+	The first two bits select the system (Powertrain, Chassis, Body or
+	Network), and the remaining 14 bits are the digits - the last three are
+	hexadecimal, though in practice you rarely see A-F.
+	"""
+	return '%s%d%X%02X' % ('PCBU'[a >> 6], (a >> 4) & 0x03, a & 0x0F, b)
+
+def decodeDTCs(messages, mode):
+	"""
+	Decode the DTCs from the messages of a Mode 03, 07 or 0A response.
+
+	On CAN the first data byte is the number of DTCs that follow. The older
+	protocols always send three DTCs per message, padded with 00 00 - so a CAN
+	message always has an even length and the others an odd one (7 bytes).
+
+	Returns a list of DTC strings, in the order received, without duplicates
+	when several ECUs report the same code.
+	"""
+	ret = []
+	for msg in messages:
+		if len(msg) < 1 or msg[0] != mode + 0x40:
+			continue
+
+		if len(msg) % 2 == 0:
+			data = msg[2:2 + msg[1] * 2]
+		else:
+			data = msg[1:]
+
+		for i in range(0, len(data) - 1, 2):
+			if data[i] == 0 and data[i+1] == 0:
+				continue
+			dtc = decodeDTC(data[i], data[i+1])
+			if dtc not in ret:
+				ret.append(dtc)
+
+	return ret
+
+def decodeStatus(messages):
+	"""
+	Decode the MIL, DTC count and readiness monitors from the messages of a
+	Mode 01 PID 01 response.
+
+	If several ECUs respond, the MIL is on if any ECU has it on, the counts are
+	summed, and a monitor is incomplete if any ECU that supports it says so.
+
+	Returns a DTCStatus, or None if no ECU responded.
+	"""
+	status = None
+
+	for msg in messages:
+		if len(msg) < 6 or msg[0] != 0x41 or msg[1] != 0x01:
+			continue
+		a, b, c, d = msg[2:6]
+
+		if b & 0x08:
+			ignition = 'compression'
+			names = __compression
+		else:
+			ignition = 'spark'
+			names = __spark
+
+		readiness = dict()
+		for i, name in enumerate(__continuous):
+			readiness[name] = (bool(b & (1 << i)), not b & (0x10 << i))
+		for i, name in enumerate(names):
+			if name != None:
+				readiness[name] = (bool(c & (1 << i)), not d & (1 << i))
+
+		if status == None:
+			status = DTCStatus(bool(a & 0x80), a & 0x7F, ignition, readiness)
+			continue
+
+		# merge with the ECUs we've already seen
+		merged = dict(status.readiness)
+		for name, (supported, complete) in readiness.items():
+			if name in merged:
+				wasSupported, wasComplete = merged[name]
+				merged[name] = (supported or wasSupported,
+						(complete or not supported) and (wasComplete or not wasSupported))
+			else:
+				merged[name] = (supported, complete)
+
+		status = DTCStatus(status.mil or bool(a & 0x80),
+				status.count + (a & 0x7F),
+				status.ignition,
+				merged)
+
+	return status
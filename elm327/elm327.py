@@ -6,11 +6,30 @@ http://github.com/fwaggle/pyELM327
 Please see License.txt and Readme.md.
 """
 
-import serial, time, pprint, re
-import pids
+import serial, time, pprint, re, json, os
+import pids, frames, dtc, monitors, samples, info
 
 pidlist = pids.__pids
 
+# Error lines the ELM327 can send instead of (or among) a response. query()
+# raises an exception named after the error.
+adapterErrors = [
+	'ACT ALERT',
+	'BUFFER FULL',
+	'BUS BUSY',
+	'BUS ERROR',
+	'CAN ERROR',
+	'DATA ERROR',
+	'FB ERROR',
+	'LP ALERT',
+	'LV RESET',
+]
+
+# Capabilities found by probeCapabilities(), keyed by adapter
+capabilityCache = dict()
+
+hexLine = re.compile('^(?:[0-9A-F]{2}){2,}$')
+
 class ELM327(object):
 	"""
 	ELM327 Class
@@ -18,10 +37,47 @@ class ELM327(object):
 	Meta-class for abstracting ELM327 device.
 	"""
 
-	def __init__(self, port, debug=0, baud=38400, rtscts=0, xonxoff=0):
+	def __init__(self, port, debug=0, baud=38400, rtscts=0, xonxoff=0, recover=1):
 		self.__debug = debug
 		self.id = None
 		self.__readBuffer = ''
+		self.__dtcCache = None
+		self.__can = None
+		self.__protocol = None
+
+		# Mode 09 identifiers don't change, so only read them once
+		self.__infoSupported = None
+		self.__vin = None
+		self.__vehicleInfo = None
+
+		# fast paths, see probeCapabilities()
+		self.capabilities = None
+		self.__multiPID = None # None == decide by protocol
+		self.__responseCount = 1
+		self.__spacesOff = 0
+
+		# Remember how we got set up, so recover() can do it all again. If
+		# "recover" is zero, errors are raised straight to the caller.
+		self.__port = port
+		self.__baud = baud
+		self.__rtscts = rtscts
+		self.__xonxoff = xonxoff
+		self.__negotiatedBaud = None
+		self.__deviceBaud = baud # the rate the device was last talking at
+		self.__settings = []
+		self.__recover = recover
+		self.__recovering = 0
+		self.reopenTimeout = 30 # seconds to keep trying to reopen the port
+
+		# time spent unavailable is in seconds
+		self.metrics = {
+			'recoveries': 0,
+			'resyncs': 0,
+			'warmResets': 0,
+			'coldResets': 0,
+			'reopens': 0,
+			'downtime': 0.0,
+		}
 
 		self.__ser = serial.Serial(port, baud, timeout=5, rtscts=rtscts, xonxoff=xonxoff)
 		self.reset()
@@ -39,6 +95,8 @@ class ELM327(object):
 		# return either just the device ID, or 'ATZ\r' followed by the ID.
 		# 'ATWS' is preferred if we've changed the baud rate because it doesn't
 		# reset all the things.
+		self.__can = None
+
 		if warm:
 			self.write('ATWS', nowait=1)
 		else:
@@ -101,17 +159,26 @@ class ELM327(object):
 		result = self.expect('^OK', 200)
 		if result != 'OK':
 			raise Exception('Couldn\'t set Baud Rate Divisor (AT BRD)')
+		previous = self.baudrate
 		self.baudrate = rate
 		
 		# we should get ELM327 at the new baud rate if it worked.
 		# it might take a bit though, normally about 1.2s, wait 5s instead.
-		result = self.expect('^ELM327', 5000)
+		try:
+			result = self.expect('^ELM327', 5000)
+		except Exception:
+			result = None # garbage at the wrong rate
 
 		# if we get header at new baud rate, ELM is expecting CR at new baud rate.
-		if result[0:6] == 'ELM327':
+		if result and result[0:6] == 'ELM327':
 			self.write('', 1)
+			self.__negotiatedBaud = rate
+			self.__deviceBaud = rate
 		else:
-			# guess it didn't work.
+			# guess it didn't work. Without the CR the ELM goes back to the old
+			# rate, so we have to as well.
+			self.baudrate = previous
+			self.empty()
 			raise Exception('Baud rate change failed - didn\'t receive header')
 
 	@property
@@ -130,10 +197,238 @@ class ELM327(object):
 		Describe the Protocol used by the ELM327, most of the time this will return AUTO
 		for no good reason.
 		"""
-		self.write('ATDP')
-		result = self.expect('^(.+)$', 200)
+		result = self.request('ATDP', '^(.+)$', 200)
 		return result
 
+	def configure(self, command):
+		"""
+		Send an AT command that changes a setting, e.g. 'ATAT2', and remember it
+		so it's restored if the device has to be reset by recover().
+		"""
+		result = self.request(command, '^OK', 200)
+		if result != 'OK':
+			raise Exception('Setting %s failed.' % command)
+		if command not in self.__settings:
+			self.__settings.append(command)
+
+	def probeCapabilities(self, cache=None, baudrates=None, refresh=0):
+		"""
+		Work out what the adapter really supports, rather than trusting the
+		version in its banner, then switch on the fastest paths it can handle.
+
+		The adapter's own capabilities are cached per adapter (by banner and
+		AT @2 identifier, or port if it doesn't have one), in memory and - if
+		"cache" is a filename - on disk as JSON, so they're only probed once
+		per adapter unless "refresh" is non-zero. Multi-PID requests and the
+		response count hint depend on the vehicle as much as the adapter, so
+		they're probed every time. The vehicle needs to be connected.
+
+		"baudrates" is an optional list of rates to try, fastest stable one
+		wins. It's slow and a dodgy adapter might need a cold reset, so it's
+		off by default.
+
+		Returns a dictionary of capabilities:
+
+		multiPID - several PIDs per request
+		adaptiveTiming - highest AT AT level accepted (0, 1 or 2)
+		spacesOff - AT S0 works, so responses are a third shorter (None if
+		the vehicle didn't answer, in which case nothing is cached)
+		responseCount - the response count hint ('010C1') works
+		maxBaud - fastest stable baud rate found, or None if not probed
+		monitorBufferFull - AT MA overflowed its buffer straight away (None
+		if not on CAN)
+		"""
+		key = self.__adapterKey()
+
+		if cache and not capabilityCache and os.path.exists(cache):
+			f = open(cache)
+			capabilityCache.update(json.load(f))
+			f.close()
+
+		caps = capabilityCache.get(key)
+		if caps == None or refresh:
+			caps = self.__probeAdapter(baudrates)
+
+			# don't remember a probe that couldn't talk to the vehicle
+			if caps['spacesOff'] != None:
+				capabilityCache[key] = caps
+				if cache:
+					f = open(cache, 'w')
+					json.dump(capabilityCache, f, indent=1)
+					f.close()
+
+		caps = dict(caps)
+		caps.update(self.__probeVehicle())
+		self.useCapabilities(caps)
+		return caps
+
+	def useCapabilities(self, caps):
+		"""
+		Switch on the fast paths in a dictionary from probeCapabilities().
+		"""
+		self.capabilities = caps
+
+		if caps.get('maxBaud') and caps['maxBaud'] > self.baudrate:
+			self.tryBaudrate(caps['maxBaud'])
+		if caps.get('adaptiveTiming'):
+			self.configure('ATAT%d' % caps['adaptiveTiming'])
+		if caps.get('spacesOff'):
+			self.configure('ATS0')
+			self.__spacesOff = 1
+
+		self.__multiPID = caps.get('multiPID')
+		self.__responseCount = caps.get('responseCount') and 1 or 0
+
+	def __adapterKey(self):
+		try:
+			ident = self.request('AT@2', '^(.+)$', 200)
+		except Exception:
+			ident = None # clones often don't do AT @2
+		if not ident:
+			ident = str(self.__port)
+		return '%s/%s' % (self.id, ident)
+
+	def __probeAdapter(self, baudrates):
+		caps = dict()
+
+		# turn the fast paths off while we test them
+		self.__spacesOff = 0
+		if 'ATS0' in self.__settings:
+			self.__settings.remove('ATS0')
+
+		caps['adaptiveTiming'] = 0
+		for level in (2, 1):
+			try:
+				if self.request('ATAT%d' % level, '^OK', 200) == 'OK':
+					caps['adaptiveTiming'] = level
+					break
+			except Exception:
+				pass
+
+		# some clones say OK to AT S0 and carry on sending spaces
+		caps['spacesOff'] = None
+		try:
+			if self.request('ATS0', '^OK', 200) == 'OK':
+				lines = self.query('0100')
+				if lines:
+					caps['spacesOff'] = ' ' not in lines[0]
+			else:
+				caps['spacesOff'] = False
+		except Exception:
+			pass
+		self.request('ATS1', '^OK', 200)
+
+		caps['monitorBufferFull'] = None
+		if self.isCAN():
+			caps['monitorBufferFull'] = self.__probeMonitor()
+
+		caps['maxBaud'] = None
+		negotiated = self.__negotiatedBaud
+		for rate in sorted(baudrates or []):
+			if rate <= self.baudrate:
+				continue
+			try:
+				self.tryBaudrate(rate)
+			except Exception:
+				# both ends are back at the last rate that worked, so just make
+				# sure we're still talking
+				self.__settle(0)
+				break
+			try:
+				for i in range(10):
+					# no recovery here, a timeout means this rate is no good
+					if self.__request('ATI', '^ELM327', 500)[0:6] != 'ELM327':
+						raise Exception('Baud rate not stable')
+				caps['maxBaud'] = rate
+			except Exception:
+				# cold reset, back to the last rate that worked
+				self.__negotiatedBaud = caps['maxBaud'] or negotiated
+				self.__settle(2)
+				break
+
+		return caps
+
+	def __settle(self, level):
+		"""
+		Recover after a failed baud rate probe, escalating as far as a cold
+		reset. Nothing is raised - if it still isn't talking, the next request
+		carries on recovering.
+		"""
+		while level <= 2:
+			try:
+				self.recover(level)
+				return
+			except Exception:
+				level += 1
+
+	def __probeVehicle(self):
+		caps = dict()
+
+		# turn the fast paths off while we test them
+		self.__multiPID = 0
+		self.__responseCount = 0
+
+		caps['responseCount'] = False
+		try:
+			lines = self.query('01001')
+			caps['responseCount'] = bool(lines) and lines[0].replace(' ', '').startswith('4100')
+		except Exception:
+			pass
+
+		# ask for the first two support bitmaps at once - if they both come
+		# back in the one response, the adapter and ECU can do multi-PID
+		caps['multiPID'] = False
+		try:
+			for msg in frames.parseResponse(self.query('010020')):
+				if len(msg) >= 11 and msg[0] == 0x41 and msg[1] == 0x00 and msg[6] == 0x20:
+					caps['multiPID'] = True
+		except Exception:
+			pass
+
+		return caps
+
+	def __probeMonitor(self):
+		"""
+		Monitor the CAN bus for a moment and see if the adapter overflows -
+		cheap clones have tiny buffers and say 'BUFFER FULL' almost at once.
+		"""
+		self.write('ATMA')
+		time.sleep(0.3)
+		self.__ser.write('X') # any character stops monitoring
+		full = False
+		start = time.time()
+		while time.time() - start < 1:
+			n = self.__ser.inWaiting()
+			if n > 0:
+				self.__readBuffer += self.__ser.read(n)
+			if 'BUFFER FULL' in self.__readBuffer:
+				full = True
+			if self.__readBuffer.endswith('>'):
+				break
+			time.sleep(0.01)
+		self.__readBuffer = '>'
+		return full
+
+	def isCAN(self):
+		"""
+		Return True if the vehicle is using one of the ISO 15765-4 (CAN)
+		protocols, which allow several PIDs per request.
+
+		The answer is cached until the next reset(). If the protocol hasn't
+		been negotiated yet (nothing has been sent to the vehicle) this returns
+		False without caching.
+		"""
+		if self.__can != None:
+			return self.__can
+
+		result = self.request('ATDPN', '^A?[0-9A-C]$', 200) # 'A6' == AUTO, 15765-4 CAN
+		if not result or result[-1] == '0':
+			return False
+
+		self.__protocol = result[-1]
+		self.__can = result[-1] in '6789BC'
+		return self.__can
+
 	def empty(self):
 		"""
 		Empty the read buffer - ensures we don't leave data in the way
@@ -164,7 +459,10 @@ class ELM327(object):
 		if nowait == None:
 			if self.__debug:
 				print "DEBUG: Waiting for '>'"
-			self.expect('>')
+			# allow as long as a request would, so a device that has gone
+			# quiet is noticed - and recovered from - no later than usual
+			if self.expect('>', 5000) == 'NO DATA':
+				raise Exception('TIMEOUT')
 
 		self.__ser.flushOutput()
 		self.__ser.write(data + '\r')
@@ -211,6 +509,10 @@ class ELM327(object):
 					if len(l) > 1 and l[0] == '>':
 						l = l[1:]
 
+					# put the spaces back in hex lines, leaving 'OK' and the like
+					if self.__spacesOff and hexLine.match(l.strip()):
+						l = self.__respace(l) + ' '
+
 					# drop each line from the read buffer as we process it.
 					self.__readBuffer = self.__readBuffer[self.__readBuffer.find('\r')+1:]
 
@@ -233,12 +535,254 @@ class ELM327(object):
 			# wait 10ms and try again
 			time.sleep(0.01)
 
+	def __respace(self, line):
+		"""
+		Put the spaces back into a line of hex sent with AT S0, so the PID
+		patterns still match. Anything that isn't a run of hex bytes is left
+		alone.
+		"""
+		line = line.strip()
+		if not hexLine.match(line):
+			return line
+		return ' '.join([line[i:i+2] for i in range(0, len(line), 2)])
+
+	def request(self, data, pattern, timeout=None):
+		"""
+		write() the data then expect() the pattern, recovering from errors
+		along the way - see recover().
+
+		Returns None if the response was 'NO DATA', and raises 'TIMEOUT' if
+		nothing matching the pattern arrives within timeout milliseconds.
+		"""
+		return self.__transact(self.__request, data, pattern, timeout)
+
+	def __request(self, data, pattern, timeout):
+		self.write(data)
+		result = self.expect(pattern, timeout)
+		# expect() returns None for a 'NO DATA' line, and 'NO DATA' itself when
+		# it times out - the device has gone quiet, so treat it like a query()
+		if result == 'NO DATA':
+			raise Exception('TIMEOUT')
+		return result
+
+	def query(self, data, timeout=5000):
+		"""
+		Send a request and return every line of the response, up to the next
+		'>' prompt. Unlike expect() this copes with multi-line responses, such
+		as multi-frame messages or several ECUs answering at once.
+
+		Returns a list of lines, which is empty if the response was 'NO DATA'.
+		Raises the same exceptions as expect() for error conditions, and
+		'TIMEOUT' if the prompt doesn't arrive within timeout milliseconds.
+		Errors are recovered from first if that's enabled - see recover().
+		"""
+		return self.__transact(self.__query, data, timeout)
+
+	def __query(self, data, timeout):
+		self.write(data)
+		start = time.time()
+
+		# expect('>') can leave the prompt it matched in the buffer
+		if self.__readBuffer.startswith('>'):
+			self.__readBuffer = self.__readBuffer[1:]
+
+		while True:
+			n = self.__ser.inWaiting()
+			if n > 0:
+				self.__readBuffer += self.__ser.read(n)
+
+			end = self.__readBuffer.find('>')
+			if end >= 0:
+				break
+
+			if ((time.time() - start) * 1000) > timeout:
+				raise Exception('TIMEOUT')
+
+			time.sleep(0.01)
+
+		# leave the prompt in the buffer, the next write() waits for it
+		response = self.__readBuffer[:end]
+		self.__readBuffer = self.__readBuffer[end:]
+
+		if self.__debug:
+			pprint.pprint(response)
+
+		lines = []
+		for l in response.replace('\n', '\r').split('\r'):
+			l = l.strip()
+			if l == '' or l == 'SEARCHING...' or l.startswith('BUS INIT'):
+				continue
+			if l.startswith('UNABLE TO CONNECT'):
+				raise Exception('UNABLE TO CONNECT')
+			if l.startswith('NO DATA'):
+				continue
+			if l.startswith('STOPPED'):
+				raise Exception('STOPPED')
+			if l.startswith('?'):
+				raise Exception('UNKNOWN COMMAND')
+			for error in adapterErrors:
+				if l.startswith(error):
+					raise Exception(error)
+			if '<DATA ERROR' in l: # bad checksum on this line
+				raise Exception('DATA ERROR')
+			if re.match('^ERR[0-9]{2}', l): # internal error, e.g. ERR94
+				raise Exception(l[0:5])
+			if self.__spacesOff:
+				l = self.__respace(l)
+			lines.append(l)
+
+		return lines
+
+	def __transact(self, fn, *args):
+		"""
+		Call fn, and if the device stops responding or the port drops out,
+		recover() and try again - escalating through each level of recovery
+		until one works or we run out.
+		"""
+		if not self.__recover or self.__recovering:
+			return fn(*args)
+
+		failed = None
+		level = 0
+		while True:
+			# the outage started when the failing attempt did - most of it is
+			# usually spent waiting for that attempt to time out
+			attempt = time.time()
+			try:
+				ret = fn(*args)
+				break
+			except Exception as e:
+				disconnected = isinstance(e, (serial.SerialException, IOError, OSError))
+				if not disconnected and str(e) not in ('STOPPED', 'TIMEOUT'):
+					raise
+				if disconnected:
+					level = max(level, 3)
+				if failed == None:
+					failed = attempt
+				error = e
+
+			# try each level in turn until one succeeds, then send again
+			while True:
+				if level > 3:
+					self.metrics['downtime'] += time.time() - failed
+					raise error
+				try:
+					self.recover(level)
+					level += 1
+					break
+				except Exception as e:
+					error = e
+					level += 1
+
+		if failed != None:
+			self.metrics['recoveries'] += 1
+			self.metrics['downtime'] += time.time() - failed
+		return ret
+
+	def recover(self, level=0):
+		"""
+		Get the device talking to us again after it's stopped responding or
+		the port has dropped out. This is done automatically (unless disabled)
+		by request() and query(), and everything built on them.
+
+		Levels, from cheapest to most expensive:
+
+		0 - Resynchronise with the prompt, so the request can be sent again
+		1 - Warm reset (AT WS), restoring the protocol and settings
+		2 - Cold reset (AT Z), restoring baud rate, protocol and settings
+		3 - Reopen the port, then warm or cold reset as needed
+
+		Raises an exception if that level of recovery didn't work.
+		"""
+		self.__recovering = 1
+		protocol = self.__protocol
+		try:
+			if level == 0:
+				self.metrics['resyncs'] += 1
+				self.empty()
+				self.write('ATI', nowait=1)
+				if not self.expect('^ELM327', 1000):
+					raise Exception('Device not responding')
+				return
+
+			if level == 1:
+				self.metrics['warmResets'] += 1
+				self.reset(warm=1)
+			elif level == 2:
+				self.metrics['coldResets'] += 1
+				self.__coldReset()
+			else:
+				self.metrics['reopens'] += 1
+				self.__reopen()
+				try:
+					# USB adaptors lose power and come back at their default
+					# baud rate, Bluetooth ones often carry on as they were
+					self.reset(warm=1)
+				except Exception:
+					self.__deviceBaud = self.__baud
+					self.__coldReset()
+
+			# put back everything reset() undid
+			if protocol != None:
+				self.write('ATSP A' + protocol)
+				if self.expect('^OK', 200) != 'OK':
+					raise Exception('Restoring protocol failed.')
+				self.__protocol = protocol
+				self.__can = protocol in '6789BC'
+			for command in self.__settings:
+				self.write(command)
+				if self.expect('^OK', 200) != 'OK':
+					raise Exception('Restoring %s failed.' % command)
+		finally:
+			self.__recovering = 0
+
+	def __coldReset(self):
+		"""
+		Full reset, then bring the baud rate back up if we'd negotiated one.
+		"""
+		if self.__deviceBaud != self.__baud:
+			# AT Z drops the device back to its default baud rate, but it has
+			# to be sent at the rate the device is at now
+			self.baudrate = self.__deviceBaud
+			self.write('ATZ', nowait=1)
+			time.sleep(1)
+			self.empty()
+		self.baudrate = self.__baud
+		self.__deviceBaud = self.__baud
+
+		self.reset()
+		if self.__negotiatedBaud != None and self.__negotiatedBaud != self.__baud:
+			self.tryBaudrate(self.__negotiatedBaud)
+
+	def __reopen(self):
+		"""
+		Close and reopen the serial port, retrying until reopenTimeout runs
+		out - a USB adaptor takes a moment to come back after it drops out.
+		"""
+		baud = self.baudrate
+		try:
+			self.__ser.close()
+		except Exception:
+			pass
+
+		start = time.time()
+		while True:
+			try:
+				self.__ser = serial.Serial(self.__port, baud, timeout=5,
+						rtscts=self.__rtscts, xonxoff=self.__xonxoff)
+				break
+			except (serial.SerialException, IOError, OSError):
+				if time.time() - start > self.reopenTimeout:
+					raise
+				time.sleep(0.5)
+
+		self.__readBuffer = ''
+
 	def fetchBatteryLevel(self):
 		"""
 		Fetch the battery level from the ELM327.
 		"""
-		self.write('AT RV')
-		result = self.expect('^[0-9\.]+V', 5000)
+		result = self.request('AT RV', '^[0-9\.]+V', 5000)
 		return result
 
 	def fetchSupportedPIDsLive(self):
@@ -256,8 +800,10 @@ class ELM327(object):
 
 		# send request for first batch
 		for i in range(0, 0x81, 32):
-			self.write('01 %02X1' % i)
-			result = self.expect('^41 ', 5000)
+			if self.__responseCount:
+				result = self.request('01 %02X1' % i, '^41 ', 5000)
+			else:
+				result = self.request('01 %02X' % i, '^41 ', 5000)
 			#result = '41 %02X BE 1F A8 13' % i # test data from Wikipedia
 			#result = '41 41 00 BF BF F9 90' % i # test data from commodore
 
@@ -291,8 +837,10 @@ class ELM327(object):
 		pid = pidlist[0x01][reqPID]
 
 		# Request the data
-		self.write('01%02x1' % reqPID)
-		result = self.expect('^41 ', 5000)
+		if self.__responseCount:
+			result = self.request('01%02x1' % reqPID, '^41 ', 5000)
+		else:
+			result = self.request('01%02x' % reqPID, '^41 ', 5000)
 
 		# Test Data
 		#result = '41 1C 01 '
@@ -312,83 +860,398 @@ class ELM327(object):
 				'name': pid['Name'],
 				'units': pid['Units']}
 
-	def fetchDTCs(self):
+	def __decodePID(self, mode, reqPID, data):
 		"""
-		Fetch Diagnostic Trouble Codes from the ECU.
-
-		Currently this function prints out the count of DTCs and the status of the
-		MIL, but this behaviour will change eventually.
-		"""
-		classes = {
-			'0': 'P0',
-			'1': 'P1',
-			'2': 'P2',
-			'3': 'P3',
-			'4': 'C0',
-			'5': 'C1',
-			'6': 'C2',
-			'7': 'C3',
-			'8': 'B0',
-			'9': 'B1',
-			'A': 'B2',
-			'B': 'B3',
-			'C': 'U0',
-			'D': 'U1',
-			'E': 'U2',
-			'F': 'U3',
-		}
-
-		self.write('0101')
-		result = self.expect('^41 01', 5000)
+		Decode the data bytes for a PID with the pattern from the PID table,
+		returning a dictionary like fetchLiveData() does.
+		"""
+		pid = pidlist[mode][reqPID]
 
-		# Test data
-		#result = '41 01 82 07 65 04 '
+		return {'pid': reqPID,
+				'value': self.__decodeValue(mode, reqPID, data),
+				'name': pid['Name'],
+				'units': pid['Units']}
 
-		if result == None:
+	def __decodeValue(self, mode, reqPID, data):
+		"""
+		Decode a list of data bytes for a PID, or 'NO DATA' if it's None.
+		"""
+		if data == None:
 			return 'NO DATA'
 
-		m = re.match('^41 01 ([A-Z0-9]{2})', result)
-		if m == None or m.group(0) == None:
+		try:
+			return samples.decoder(mode, reqPID)(data)
+		except IndexError:
 			raise Exception('Malformed response')
 
-		cel = int(m.group(1), 16) & 0x80
-		count = int(m.group(1), 16) - cel
-		cel = cel / 0x80
+	def fetchSample(self, reqPID, sample=None):
+		"""
+		Lean version of fetchLiveData() for high-rate polling, returning a
+		samples.Sample instead of a new dictionary.
+
+		If a Sample is passed in, it's filled in and returned rather than
+		allocating a new one.
+		"""
+		meta = pidlist[0x01].get(reqPID)
+		if meta == None:
+			raise KeyError('Unsupported PID 0x%02x' % reqPID)
+		if sample == None:
+			sample = samples.Sample()
+
+		lines = self.query(samples.request(reqPID, self.__responseCount))
+		val = 'NO DATA'
+		if lines:
+			pattern = samples.pattern(0x01, reqPID)
+			for line in lines:
+				m = pattern.match(line)
+				if m != None:
+					val = meta['Value'](m)
+					break
+			else:
+				raise Exception('Malformed response')
+
+		sample.pid = reqPID
+		sample.value = val
+		sample.time = time.time()
+		sample.meta = meta
+		return sample
+
+	def fetchSamples(self, reqPIDs, buf=None):
+		"""
+		Fetch several PIDs into a list of samples.Sample, one per PID in the
+		same order. On CAN, up to six PIDs go in each request.
+
+		Pass the list back in as "buf" on the next call (or make one with
+		samples.allocate()) and the same Samples are filled in every time.
+		"""
+		for reqPID in reqPIDs:
+			if reqPID not in pidlist[0x01]:
+				raise KeyError('Unsupported PID 0x%02x' % reqPID)
+		if buf == None:
+			buf = samples.allocate(len(reqPIDs))
+
+		if not self.__batching():
+			for i in range(len(reqPIDs)):
+				self.fetchSample(reqPIDs[i], buf[i])
+			return buf
+
+		data = self.__fetchPIDs(0x01, reqPIDs)
+		now = time.time()
+		for i in range(len(reqPIDs)):
+			reqPID = reqPIDs[i]
+			sample = buf[i]
+			sample.pid = reqPID
+			sample.value = self.__decodeValue(0x01, reqPID, data.get(reqPID))
+			sample.time = now
+			sample.meta = pidlist[0x01][reqPID]
+
+		return buf
+
+	def __batching(self):
+		"""
+		Whether we can put several PIDs in one request - only ever on CAN, and
+		only if the probe found it works, if there's been one.
+		"""
+		if self.__multiPID == None:
+			return self.isCAN()
+		return self.isCAN() and self.__multiPID
+
+	def __fetchPIDs(self, mode, reqPIDs, frame=None):
+		"""
+		Request several PIDs, batching as many into each request as the
+		protocol allows - six per request on CAN, or three for freeze frames
+		since each PID is followed by the frame number. The older protocols
+		get one PID per request.
+
+		Returns a dictionary of PID -> list of data bytes, for the PIDs that
+		got an answer. If several ECUs answer, the first one wins.
+		"""
+		if not self.__batching():
+			batch = 1
+		elif frame == None:
+			batch = 6
+		else:
+			batch = 3
+
+		ret = dict()
+		for i in range(0, len(reqPIDs), batch):
+			request = '%02X' % mode
+			for reqPID in reqPIDs[i:i + batch]:
+				request += '%02X' % reqPID
+				if frame != None:
+					request += '%02X' % frame
+
+			for msg in frames.parseResponse(self.query(request)):
+				if len(msg) < 1 or msg[0] != 0x40 + mode:
+					continue
+
+				pos = 1
+				while pos < len(msg):
+					reqPID = msg[pos]
+					pos += 1
+					if frame != None:
+						pos += 1
+					try:
+						n = pids.length(mode, reqPID)
+					except KeyError:
+						break # can't tell where the next PID starts
+					if reqPID not in ret:
+						ret[reqPID] = msg[pos:pos + n]
+					pos += n
+
+		return ret
 
-		print ("CEL: %d DTC Count: %d" % (cel, count))
+	def fetchSupportedPIDsFreezeFrame(self, frame=0):
+		"""
+		Fetch a list of supported PIDs for a Freeze Frame (Mode 02)
 
-		if count < 1:
-			return
+		Returns a dictionary in the same form as fetchSupportedPIDsLive().
+		"""
+		supported = dict()
 
-		self.write('03')
-		result = self.expect('^43 ', 5000)
+		bitmaps = self.__fetchPIDs(0x02, range(0, 0x81, 32), frame)
+		for i, data in bitmaps.items():
+			if len(data) < 4:
+				continue
+			flags = (data[0] << 24) | (data[1] << 16) | (data[2] << 8) | data[3]
+			for flag in range(31, -1, -1):
+				if flags & (1 << flag) and (32-flag) + i in pidlist[0x02]:
+					supported[("%02X" % ((32-flag) + i))] = 1
 
-		# Test data
-		#result = '43 01 33 81 34 00 00 '
+		return supported
 
-		pprint.pprint(result)
+	def fetchFreezeFrameData(self, reqPID, frame=0):
+		"""
+		Fetch a single PID from a Freeze Frame (Mode 02), returning a
+		dictionary like fetchLiveData() does.
+		"""
+		if reqPID not in pidlist[0x02]:
+			raise KeyError('Unsupported PID 0x%02x' % reqPID)
 
-		m = re.match('^43 (([A-Z0-9]{2} [A-Z0-9]{2} )+)', result)
-		if m == None or m.group(0) == None:
-			return
+		data = self.__fetchPIDs(0x02, [reqPID], frame)
+		return self.__decodePID(0x02, reqPID, data.get(reqPID))
 
-		#print m.group(1)
+	def fetchFreezeFrame(self, frame=0):
+		"""
+		Fetch a whole Freeze Frame (Mode 02) snapshot, batching the requests.
 
+		Returns a dictionary with the frame number, the DTC that caused it to be
+		stored ('dtc') and a dictionary of PID -> sample ('data'), where each
+		sample is like the ones fetchLiveData() returns. Returns None if there's
+		no freeze frame stored.
 		"""
-		NOTE: I don't actually know if the last three digits of the DTC
-		are to be interpreted as decimals or HEX, and the ELM327 datasheet
-		is ambiguous. Assuming the former for the time being.
+		supported = sorted([int(spid, 16) for spid in self.fetchSupportedPIDsFreezeFrame(frame)])
+		if 0x02 in supported:
+			supported.remove(0x02)
+		data = self.__fetchPIDs(0x02, [0x02] + supported, frame)
+
+		# DTC 00 00 means no freeze frame is stored
+		if not data.get(0x02) or data[0x02] == [0, 0]:
+			return None
+
+		ret = {'frame': frame,
+				'dtc': self.__decodePID(0x02, 0x02, data[0x02])['value'],
+				'data': dict()}
+
+		for reqPID in supported:
+			if reqPID in data:
+				ret['data'][reqPID] = self.__decodePID(0x02, reqPID, data[reqPID])
+
+		return ret
+
+	def fetchSupportedMonitors(self):
 		"""
+		Fetch a list of supported On-Board Monitor IDs (Mode 06).
+
+		All the support bitmaps are asked for at once, six per request. Only
+		CAN vehicles are supported - the older protocols use a different
+		format for Mode 06 that we don't decode.
+
+		Returns a sorted list of MIDs.
+		"""
+		if not self.isCAN():
+			raise Exception('Mode 06 is only supported on CAN')
+
+		ranges = range(0, 0x100, 0x20)
+		messages = []
+		for i in range(0, len(ranges), 6):
+			request = '06' + ''.join(['%02X' % mid for mid in ranges[i:i + 6]])
+			messages.extend(frames.parseResponse(self.query(request)))
+
+		return monitors.decodeSupported(messages)
+
+	def fetchMonitorResults(self, mids=None):
+		"""
+		Fetch On-Board Monitoring Test Results (Mode 06) for the given MIDs,
+		or every supported MID if none are given.
+
+		Only one MID may be requested at a time, but each response carries all
+		the tests for that monitor in one multi-frame message.
+
+		Returns a list of monitors.MonitorResult.
+		"""
+		if mids == None:
+			mids = self.fetchSupportedMonitors()
+		elif not self.isCAN():
+			raise Exception('Mode 06 is only supported on CAN')
 
-		dtcs = re.findall('([A-Z0-9]{2} [A-Z0-9]{2}) ', m.group(1))
 		ret = []
-		for dtc in dtcs:
-			if dtc != '00 00':
-				cls = dtc[0:1]
-				ret.append("%s%s" % (classes[cls], dtc[1:].replace(' ', '')))
+		for mid in mids:
+			messages = frames.parseResponse(self.query('06%02X' % mid))
+			ret.extend(monitors.decodeResults(messages))
 
 		return ret
 
+	def fetchSupportedInfo(self):
+		"""
+		Fetch the set of supported Vehicle Information (Mode 09) PIDs. This is
+		only read from the vehicle once per connection.
+		"""
+		if self.__infoSupported == None:
+			messages = frames.parseResponse(self.query('0900'))
+			self.__infoSupported = info.decodeSupported(messages)
+		return self.__infoSupported
+
+	def __fetchInfo(self, pid):
+		"""
+		Fetch a Mode 09 PID, returning a list of data bytes per ECU, or an
+		empty list if it isn't supported.
+		"""
+		if pid not in self.fetchSupportedInfo():
+			return []
+		messages = frames.parseResponse(self.query('09%02X' % pid))
+		return info.reassemble(messages, pid, self.isCAN())
+
+	def fetchVIN(self):
+		"""
+		Fetch the Vehicle Identification Number (Mode 09 PID 02), or None if
+		the vehicle doesn't report it. This is only read from the vehicle once
+		per connection.
+		"""
+		if self.__vin == None:
+			data = self.__fetchInfo(0x02)
+			if data:
+				self.__vin = info.decodeString(data[0])
+		return self.__vin
+
+	def fetchVehicleInfo(self, cache=None, refresh=0):
+		"""
+		Fetch the VIN, calibration IDs, calibration verification numbers and
+		ECU names (Mode 09), returning an info.VehicleInfo.
+
+		These are only read from the vehicle once per connection. If "cache"
+		is a filename, everything but the VIN is also kept there as JSON,
+		keyed by VIN - so a vehicle we've seen before only needs its VIN read.
+		Pass a non-zero "refresh" to read everything again, e.g. after the ECU
+		has been reflashed.
+		"""
+		if refresh:
+			self.__vin = None
+			self.__vehicleInfo = None
+		if self.__vehicleInfo != None:
+			return self.__vehicleInfo
+
+		vin = self.fetchVIN()
+
+		stored = dict()
+		if cache and os.path.exists(cache):
+			f = open(cache)
+			stored = json.load(f)
+			f.close()
+
+		if vin and vin in stored and not refresh:
+			known = stored[vin]
+			self.__vehicleInfo = info.VehicleInfo(vin, known['calibrationIDs'],
+					known['cvns'], known['ecuNames'])
+			return self.__vehicleInfo
+
+		calibrationIDs = []
+		for data in self.__fetchInfo(0x04):
+			calibrationIDs.extend(info.decodeStrings(data, 16))
+		cvns = []
+		for data in self.__fetchInfo(0x06):
+			cvns.extend(info.decodeCVNs(data))
+		ecuNames = []
+		for data in self.__fetchInfo(0x0A):
+			ecuNames.extend(info.decodeStrings(data, 20))
+
+		self.__vehicleInfo = info.VehicleInfo(vin, calibrationIDs, cvns, ecuNames)
+
+		if cache and vin:
+			stored[vin] = {'calibrationIDs': calibrationIDs,
+					'cvns': cvns,
+					'ecuNames': ecuNames}
+			f = open(cache, 'w')
+			json.dump(stored, f, indent=1)
+			f.close()
+
+		return self.__vehicleInfo
+
+	def fetchPerformanceTracking(self):
+		"""
+		Fetch In-use Performance Tracking counters (Mode 09 PID 08 or 0B).
+		These change as the vehicle is driven, so they're never cached.
+
+		Returns a list with a dictionary of counter name -> count for each ECU
+		that responded.
+		"""
+		ret = []
+		for pid in (0x08, 0x0B):
+			for data in self.__fetchInfo(pid):
+				ret.append(info.decodeTracking(data, pid))
+		return ret
+
+	def fetchDTCs(self):
+		"""
+		Fetch stored Diagnostic Trouble Codes from the ECU.
+
+		Returns a list of DTC strings like 'P0133', or 'NO DATA' if the ECU
+		didn't report its status. See fetchAllDTCs() for pending and permanent
+		codes and the MIL status.
+		"""
+		report = self.fetchAllDTCs()
+		if report == None:
+			return 'NO DATA'
+		return report.stored
+
+	def fetchDTCStatus(self):
+		"""
+		Fetch the MIL (Check Engine light) status, DTC count and readiness
+		monitors from Mode 01 PID 01.
+
+		Returns a dtc.DTCStatus, or None if no ECU responded.
+		"""
+		return dtc.decodeStatus(frames.parseResponse(self.query('0101')))
+
+	def fetchAllDTCs(self, force=0):
+		"""
+		Fetch the MIL status and stored (Mode 03), pending (Mode 07) and
+		permanent (Mode 0A) DTCs from every ECU that responds.
+
+		The requests are sent back to back as soon as each prompt arrives. If
+		the MIL state and DTC count haven't changed since the last call, the
+		previous codes are returned without reading them again - pass a
+		non-zero "force" to read them regardless.
+
+		Returns a dtc.DTCReport, or None if no ECU responded to Mode 01 PID 01.
+		"""
+		status = self.fetchDTCStatus()
+		if status == None:
+			return None
+
+		if not force and self.__dtcCache != None:
+			last = self.__dtcCache.status
+			if last.mil == status.mil and last.count == status.count:
+				self.__dtcCache = self.__dtcCache._replace(status=status)
+				return self.__dtcCache
+
+		stored = dtc.decodeDTCs(frames.parseResponse(self.query('03')), 0x03)
+		pending = dtc.decodeDTCs(frames.parseResponse(self.query('07')), 0x07)
+		permanent = dtc.decodeDTCs(frames.parseResponse(self.query('0A')), 0x0A)
+
+		self.__dtcCache = dtc.DTCReport(status, stored, pending, permanent)
+		return self.__dtcCache
+
 	def clearDTCs(self, confirm=0):
 		"""
 		Clear Diagnostic Trouble Codes from the ECU.
@@ -398,6 +1261,7 @@ class ELM327(object):
 		clear the codes, otherwise an exception is raised.
 		"""
 		if confirm:
+			self.__dtcCache = None
 			self.write('04')
 			result = self.expect('^44', 5000)
 			return result
@@ -0,0 +1,67 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# Reassembly of multi-line responses into messages.
+#
+# With headers off (the default), the ELM327 formats an ISO 15765 (CAN)
+# multi-frame response as a byte count line followed by numbered frames:
+#
+#	014
+#	0: 49 02 01 31 44 34
+#	1: 47 50 30 30 52 35 35
+#	2: 42 31 32 33 34 35 36
+#
+# Single frame responses - and every response on the older protocols - are
+# just one line of hex bytes each. Several ECUs answering the same request
+# show up as several messages.
+
+import re
+
+__count = re.compile('^[0-9A-F]{3}$')
+__frame = re.compile('^([0-9A-F]):\s*([0-9A-F ]*)$')
+__data = re.compile('^[0-9A-F ]+$')
+
+def hexBytes(line):
+	"""
+	Convert a line of hex, with or without spaces (AT S0), to a list of ints.
+	"""
+	h = line.replace(' ', '')
+	return [int(h[i:i+2], 16) for i in range(0, len(h) - 1, 2)]
+
+def parseResponse(lines):
+	"""
+	Reassemble the lines returned by ELM327.query() into messages.
+
+	Returns a list of messages, each a list of byte values starting with the
+	response mode (e.g. 0x43 for a Mode 03 response). Lines that aren't hex
+	(status or error text) are skipped.
+	"""
+	messages = []
+	current = None
+	length = 0
+
+	for line in lines:
+		if __count.match(line):
+			current = []
+			length = int(line, 16)
+			messages.append((current, length))
+			continue
+
+		m = __frame.match(line)
+		if m != None and current != None:
+			current.extend(hexBytes(m.group(2)))
+			continue
+
+		current = None
+		if not __data.match(line):
+			continue
+		data = hexBytes(line)
+		messages.append((data, len(data)))
+
+	# trim the padding from the last frame of each multi-frame message
+	return [data[:length] for data, length in messages]
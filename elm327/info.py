@@ -0,0 +1,137 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# Decoding of Vehicle Information (Mode 09).
+#
+# On CAN each ECU sends one (usually multi-frame) message per PID:
+#
+#	49 02 01 31 44 34 47 50 ...	- PID, number of data items, then the data
+#
+# On the older protocols each ECU sends several single line messages of four
+# data bytes each, with a sequence number in front:
+#
+#	49 02 01 00 00 00 31
+#	49 02 02 44 34 47 50
+#	...
+
+from collections import namedtuple
+
+class VehicleInfo(namedtuple('VehicleInfo', 'vin calibrationIDs cvns ecuNames')):
+	"""
+	Static identifiers from Mode 09. vin is a string, the rest are lists of
+	strings from every ECU that responded.
+	"""
+	__slots__ = ()
+
+# In-use performance tracking counter names, PID 08 (spark ignition) and
+# PID 0B (compression ignition)
+__spark = [
+	'OBDCOND', 'IGNCNTR',
+	'CATCOMP1', 'CATCOND1', 'CATCOMP2', 'CATCOND2',
+	'O2SCOMP1', 'O2SCOND1', 'O2SCOMP2', 'O2SCOND2',
+	'EGRCOMP', 'EGRCOND', 'AIRCOMP', 'AIRCOND',
+	'EVAPCOMP', 'EVAPCOND',
+	'SO2SCOMP1', 'SO2SCOND1', 'SO2SCOMP2', 'SO2SCOND2',
+]
+
+__compression = [
+	'OBDCOND', 'IGNCNTR',
+	'HCCATCOMP', 'HCCATCOND', 'NCATCOMP', 'NCATCOND',
+	'NADSCOMP', 'NADSCOND', 'PMCOMP', 'PMCOND',
+	'EGSCOMP', 'EGSCOND', 'EGRCOMP', 'EGRCOND',
+	'BPCOMP', 'BPCOND', 'FUELCOMP', 'FUELCOND',
+]
+
+def reassemble(messages, pid, can):
+	"""
+	Collect the data bytes for a PID from the messages of a Mode 09 response.
+
+	Returns a list with one list of data bytes per ECU that responded, with
+	the number of data items (CAN) or sequence numbers (everything else)
+	removed.
+	"""
+	ret = []
+	current = None
+
+	for msg in messages:
+		if len(msg) < 3 or msg[0] != 0x49 or msg[1] != pid:
+			continue
+
+		if can:
+			ret.append(msg[3:])
+			continue
+
+		# sequence numbers start again at 1 for each ECU
+		if current == None or msg[2] <= 1:
+			current = []
+			ret.append(current)
+		current.extend(msg[3:])
+
+	return ret
+
+def decodeSupported(messages):
+	"""
+	Decode the Mode 09 PID 00 support bitmap, from every ECU that responded.
+	The bitmap is always the last four bytes, whichever protocol it is.
+
+	Returns a set of supported PIDs.
+	"""
+	supported = set()
+	for msg in messages:
+		if len(msg) < 6 or msg[0] != 0x49 or msg[1] != 0x00:
+			continue
+		flags = (msg[-4] << 24) | (msg[-3] << 16) | (msg[-2] << 8) | msg[-1]
+		for flag in range(31, -1, -1):
+			if flags & (1 << flag):
+				supported.add(32 - flag)
+
+	return supported
+
+def decodeString(data):
+	"""
+	Decode ASCII data, dropping the 00 padding.
+	"""
+	return ''.join([chr(b) for b in data if b != 0]).strip()
+
+def decodeStrings(data, size):
+	"""
+	Decode a run of fixed size ASCII items, like calibration IDs (16 bytes)
+	or ECU names (20 bytes). Empty items are dropped.
+	"""
+	ret = []
+	for i in range(0, len(data) - size + 1, size):
+		s = decodeString(data[i:i+size])
+		if s:
+			ret.append(s)
+	return ret
+
+def decodeCVNs(data):
+	"""
+	Decode a run of four byte Calibration Verification Numbers into hex.
+	"""
+	return ['%02X%02X%02X%02X' % tuple(data[i:i+4]) for i in range(0, len(data) - 3, 4)]
+
+def decodeTracking(data, pid):
+	"""
+	Decode in-use performance tracking counters (PID 08 or 0B) into a
+	dictionary of counter name -> count.
+	"""
+	if pid == 0x0B:
+		names = __compression
+	else:
+		names = __spark
+
+	ret = dict()
+	for i in range(0, len(data) - 1, 2):
+		n = i // 2
+		if n < len(names):
+			name = names[n]
+		else:
+			name = 'COUNTER%d' % (n + 1)
+		ret[name] = (data[i] << 8) | data[i+1]
+	return ret
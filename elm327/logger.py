@@ -0,0 +1,301 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# High-rate data logger.
+#
+#	python -m elm327.logger /dev/ttyUSB0 --pids 0C,0D,10 --rate 10
+#	python -m elm327.logger /dev/ttyUSB0 --pids 0C,0D,05 --rate 1,0C=20,0D=5
+#
+# Polls the chosen PIDs (or every supported PID) at a target rate - either one
+# rate for them all, or a rate per PID with the plain number (if any) used for
+# the rest - and hands the samples to a background thread which writes them to
+# gzipped CSV or binary files, rotating them by size or age and syncing them
+# to disk every so often rather than on every sample. Press CTRL+C to stop,
+# and it reports the rate it actually achieved for each PID and how many
+# samples were lost.
+
+import sys, os, time, gzip, struct, threading, argparse, numbers
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+
+import elm327, samples
+
+# Binary format: a 4 byte magic, then one record per sample of timestamp, PID
+# and value (NaN if the value isn't a number).
+MAGIC = b'ELML'
+RECORD = struct.Struct('<dBd')
+NAN = float('nan')
+
+class Writer(threading.Thread):
+	"""
+	Background writer - takes (time, pid, value) tuples off a queue and
+	writes them to rotating gzipped files.
+	"""
+
+	def __init__(self, prefix, format='csv', rotateSize=None, rotateTime=None,
+			syncInterval=5.0, queueSize=10000):
+		threading.Thread.__init__(self)
+		self.daemon = True
+
+		self.prefix = prefix
+		self.format = format
+		self.rotateSize = rotateSize # bytes (compressed)
+		self.rotateTime = rotateTime # seconds
+		self.syncInterval = syncInterval # seconds
+		self.queue = queue.Queue(queueSize)
+		self.dropped = 0
+		self.files = []
+
+		self.__raw = None
+		self.__gz = None
+		self.__opened = 0
+		self.__synced = 0
+		self.__stop = threading.Event()
+
+	def put(self, t, pid, value):
+		"""
+		Queue a sample for writing. If the writer has fallen that far behind,
+		the sample is dropped and counted rather than holding up polling.
+		"""
+		try:
+			self.queue.put_nowait((t, pid, value))
+		except queue.Full:
+			self.dropped += 1
+
+	def stop(self):
+		self.__stop.set()
+		self.join()
+
+	def run(self):
+		self.__rotate()
+		while True:
+			try:
+				record = self.queue.get(True, 0.5)
+			except queue.Empty:
+				record = None
+
+			if record != None:
+				self.__write(record)
+
+			now = time.time()
+			if self.rotateTime and now - self.__opened >= self.rotateTime:
+				self.__rotate()
+			elif self.rotateSize and self.__raw.tell() >= self.rotateSize:
+				self.__rotate()
+			elif now - self.__synced >= self.syncInterval:
+				self.__sync()
+
+			if record == None and self.__stop.is_set():
+				break
+
+		self.__close()
+
+	def __write(self, record):
+		t, pid, value = record
+		if self.format == 'csv':
+			if not isinstance(value, numbers.Real):
+				value = '"%s"' % value
+			self.__gz.write(('%.3f,%02X,%s\n' % (t, pid, value)).encode('ascii'))
+		else:
+			if not isinstance(value, numbers.Real):
+				value = NAN
+			self.__gz.write(RECORD.pack(t, pid, value))
+
+	def __rotate(self):
+		self.__close()
+
+		now = time.time()
+		name = '%s-%s-%03d.%s.gz' % (self.prefix,
+				time.strftime('%Y%m%d-%H%M%S', time.localtime(now)),
+				len(self.files), self.format)
+		self.files.append(name)
+
+		self.__raw = open(name, 'wb')
+		self.__gz = gzip.GzipFile(fileobj=self.__raw, mode='wb')
+		if self.format == 'csv':
+			self.__gz.write(b'time,pid,value\n')
+		else:
+			self.__gz.write(MAGIC)
+		self.__opened = now
+		self.__synced = now
+
+	def __sync(self):
+		# flush the compressor so everything so far can be decompressed, then
+		# get it onto the disk
+		self.__gz.flush()
+		self.__raw.flush()
+		os.fsync(self.__raw.fileno())
+		self.__synced = time.time()
+
+	def __close(self):
+		if self.__gz == None:
+			return
+		self.__gz.close()
+		self.__raw.flush()
+		os.fsync(self.__raw.fileno())
+		self.__raw.close()
+		self.__gz = None
+		self.__raw = None
+
+def parsePIDs(text):
+	"""
+	Parse a comma separated list of hex PIDs, e.g. '0C,0D,10'.
+	"""
+	return [int(pid, 16) for pid in text.split(',') if pid.strip()]
+
+def parseRates(text, default=1.0):
+	"""
+	Parse target rates in Hz, e.g. '10' for every PID or '1,0C=20,0D=5' for
+	20 Hz RPM, 5 Hz coolant temperature and 1 Hz for everything else.
+
+	Returns (default rate, dictionary of PID -> rate).
+	"""
+	rates = dict()
+	for item in text.split(','):
+		item = item.strip()
+		if not item:
+			continue
+		if '=' in item:
+			pid, rate = item.split('=', 1)
+			rates[int(pid, 16)] = float(rate)
+		else:
+			default = float(item)
+	for rate in [default] + list(rates.values()):
+		if rate <= 0:
+			raise ValueError('Rates must be above zero')
+	return default, rates
+
+def poll(elm, writer, pids, rate, duration=None):
+	"""
+	Poll the PIDs at the target rate (in Hz, either one number for every PID
+	or a dictionary of PID -> rate) until CTRL+C or the duration (seconds)
+	runs out, passing samples to the writer.
+
+	Returns a dictionary of PID -> [samples taken, samples missed], where a
+	missed sample is one that was due but the bus couldn't keep up, and the
+	number of seconds spent polling.
+	"""
+	if isinstance(rate, dict):
+		period = dict((pid, 1.0 / rate[pid]) for pid in pids)
+	else:
+		period = dict((pid, 1.0 / rate) for pid in pids)
+	stats = dict((pid, [0, 0]) for pid in pids)
+	due = dict((pid, time.time()) for pid in pids)
+	buf = samples.allocate(len(pids))
+	start = time.time()
+
+	try:
+		while duration == None or time.time() - start < duration:
+			now = time.time()
+			ready = [pid for pid in pids if due[pid] <= now]
+			if not ready:
+				time.sleep(max(0, min(due.values()) - now))
+				continue
+
+			for pid in ready:
+				# count every slot we've skipped past since it was due
+				behind = int((now - due[pid]) / period[pid])
+				stats[pid][1] += behind
+				due[pid] += (behind + 1) * period[pid]
+
+			for sample in elm.fetchSamples(ready, buf[:len(ready)]):
+				writer.put(sample.time, sample.pid, sample.value)
+				stats[sample.pid][0] += 1
+	except KeyboardInterrupt:
+		pass
+
+	return stats, time.time() - start
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Log OBD2 live data from an ELM327.')
+	parser.add_argument('port', help='serial port, e.g. /dev/ttyUSB0')
+	parser.add_argument('--baud', type=int, default=38400,
+			help='baud rate the device starts at (default 38400)')
+	parser.add_argument('--fast-baud', type=int,
+			help='try to switch to this baud rate after connecting')
+	parser.add_argument('--capabilities', default=os.path.expanduser('~/.elm327-capabilities.json'),
+			help='file to cache adapter capabilities in')
+	parser.add_argument('--no-probe', action='store_true',
+			help="don't probe the adapter for fast paths")
+	parser.add_argument('--pids',
+			help='comma separated hex PIDs to log (default: every supported PID)')
+	parser.add_argument('--rate', default='1',
+			help='target samples per second for each PID, or per PID as in '
+				'1,0C=20,0D=5 (default 1)')
+	parser.add_argument('--format', choices=['csv', 'bin'], default='csv')
+	parser.add_argument('--output', default='elm327',
+			help='output file prefix (default elm327)')
+	parser.add_argument('--rotate-size', type=float,
+			help='start a new file after this many megabytes')
+	parser.add_argument('--rotate-time', type=float,
+			help='start a new file after this many seconds')
+	parser.add_argument('--sync', type=float, default=5.0,
+			help='seconds between flushing to disk (default 5)')
+	parser.add_argument('--duration', type=float,
+			help='stop after this many seconds')
+	args = parser.parse_args(argv)
+
+	try:
+		default, rates = parseRates(args.rate)
+	except ValueError:
+		parser.error('bad --rate: %s' % args.rate)
+
+	with elm327.ELM327(args.port, baud=args.baud) as elm:
+		if args.fast_baud:
+			elm.tryBaudrate(args.fast_baud)
+		if not args.no_probe:
+			elm.probeCapabilities(args.capabilities)
+		print("Device reports as: %s @ %d bps" % (elm.id, elm.baudrate))
+
+		supported = [int(spid, 16) for spid in elm.fetchSupportedPIDsLive()]
+		if args.pids:
+			pids = parsePIDs(args.pids)
+			for pid in pids:
+				if pid not in samples.pidlist[0x01]:
+					print("PID %02X isn't supported by the library" % pid)
+					return 1
+				if pid not in supported:
+					print("Warning: PID %02X isn't supported by the ECU" % pid)
+		else:
+			pids = sorted(supported)
+		if not pids:
+			print("No PIDs to log.")
+			return 1
+		for pid in rates:
+			if pid not in pids:
+				print("Warning: PID %02X has a rate but isn't being logged" % pid)
+		rate = dict((pid, rates.get(pid, default)) for pid in pids)
+
+		rotateSize = None
+		if args.rotate_size:
+			rotateSize = int(args.rotate_size * 1024 * 1024)
+
+		writer = Writer(args.output, args.format, rotateSize, args.rotate_time, args.sync)
+		writer.start()
+		try:
+			stats, elapsed = poll(elm, writer, pids, rate, args.duration)
+		finally:
+			writer.stop()
+
+		print("")
+		print("%-50s %10s %10s %10s" % ('PID', 'Target', 'Rate (Hz)', 'Missed'))
+		for pid in pids:
+			written, missed = stats[pid]
+			print("%02X %-47s %10.2f %10.2f %10d" % (pid, samples.pidlist[0x01][pid]['Name'],
+					rate[pid], written / elapsed if elapsed > 0 else 0, missed))
+		print("Samples dropped by writer: %d" % writer.dropped)
+		print("Recoveries: %d (%.1fs unavailable)" % (elm.metrics['recoveries'],
+				elm.metrics['downtime']))
+		print("Files: %s" % ', '.join(writer.files))
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
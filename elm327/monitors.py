@@ -0,0 +1,205 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# Decoding of On-Board Monitoring Test Results (Mode 06), as laid out for
+# ISO 15765-4 (CAN). Each test result in a response is nine bytes:
+#
+#	MID TID UASID VALUE(2) MIN(2) MAX(2)
+#
+# The Unit And Scaling ID (UASID) says how to turn the raw 16 bit values into
+# something with units. Most of these tables are from SAE J1979 Appendix E.
+
+from collections import namedtuple
+
+class MonitorResult(namedtuple('MonitorResult', 'mid name tid value min max units passed')):
+	"""
+	A single Mode 06 test result. value, min and max are already scaled into
+	units; passed is True if value is within the limits.
+	"""
+	__slots__ = ()
+
+# UASID: (units, scale, offset, signed)
+__uas = {
+	0x01: ('', 1, 0, False),
+	0x02: ('', 0.1, 0, False),
+	0x03: ('', 0.01, 0, False),
+	0x04: ('', 0.001, 0, False),
+	0x05: ('', 0.0000305, 0, False),
+	0x06: ('', 0.000305, 0, False),
+	0x07: ('RPM', 0.25, 0, False),
+	0x08: ('km/h', 0.01, 0, False),
+	0x09: ('km/h', 1, 0, False),
+	0x0A: ('mV', 0.122, 0, False),
+	0x0B: ('V', 0.001, 0, False),
+	0x0C: ('V', 0.01, 0, False),
+	0x0D: ('mA', 0.00390625, 0, False),
+	0x0E: ('A', 0.001, 0, False),
+	0x0F: ('A', 0.01, 0, False),
+	0x10: ('ms', 1, 0, False),
+	0x11: ('ms', 100, 0, False),
+	0x12: ('s', 1, 0, False),
+	0x13: ('mOhm', 1, 0, False),
+	0x14: ('Ohm', 1, 0, False),
+	0x15: ('kOhm', 1, 0, False),
+	0x16: ('*C', 0.1, -40, False),
+	0x17: ('kPa (gauge)', 0.01, 0, False),
+	0x18: ('kPa (air)', 0.0117, 0, False),
+	0x19: ('kPa (gauge)', 0.079, 0, False),
+	0x1A: ('kPa (gauge)', 1, 0, False),
+	0x1B: ('kPa (gauge)', 10, 0, False),
+	0x1C: ('*', 0.01, 0, False),
+	0x1D: ('*', 0.5, 0, False),
+	0x1E: ('ratio', 0.0000305, 0, False),
+	0x1F: ('ratio', 0.05, 0, False),
+	0x20: ('ratio', 0.0039062, 0, False),
+	0x21: ('mHz', 1, 0, False),
+	0x22: ('Hz', 1, 0, False),
+	0x23: ('kHz', 1, 0, False),
+	0x24: ('counts', 1, 0, False),
+	0x25: ('km', 1, 0, False),
+	0x26: ('mV/ms', 0.1, 0, False),
+	0x27: ('g/s', 0.01, 0, False),
+	0x28: ('g/s', 1, 0, False),
+	0x29: ('Pa/s', 0.25, 0, False),
+	0x2A: ('kg/h', 0.001, 0, False),
+	0x2B: ('switches', 1, 0, False),
+	0x2C: ('g/cyl', 0.01, 0, False),
+	0x2D: ('mg/stroke', 0.01, 0, False),
+	0x2E: ('', 1, 0, False), # true/false
+	0x2F: ('%', 0.01, 0, False),
+	0x30: ('%', 0.001526, 0, False),
+	0x31: ('L', 0.001, 0, False),
+	0x32: ('inch', 0.0000305, 0, False),
+	0x33: ('ratio', 0.00024414, 0, False),
+	0x34: ('minutes', 1, 0, False),
+	0x35: ('ms', 10, 0, False),
+	0x36: ('g', 0.01, 0, False),
+	0x37: ('g', 0.1, 0, False),
+	0x38: ('g', 1, 0, False),
+	0x39: ('%', 0.01, -327.68, False),
+	0x3A: ('g', 0.001, 0, False),
+	0x3B: ('g', 0.0001, 0, False),
+	0x3C: ('us', 0.1, 0, False),
+	0x3D: ('mA', 0.01, 0, False),
+	0x3E: ('mm^2', 0.0000610, 0, False),
+	0x3F: ('L', 0.01, 0, False),
+	0x40: ('ppm', 1, 0, False),
+	0x41: ('uA', 0.01, 0, False),
+	0x81: ('', 1, 0, True),
+	0x82: ('', 0.1, 0, True),
+	0x83: ('', 0.01, 0, True),
+	0x84: ('', 0.001, 0, True),
+	0x85: ('', 0.0000305, 0, True),
+	0x86: ('', 0.000305, 0, True),
+	0x8A: ('mV', 0.122, 0, True),
+	0x8B: ('V', 0.001, 0, True),
+	0x8C: ('V', 0.01, 0, True),
+	0x8D: ('mA', 0.00390625, 0, True),
+	0x8E: ('A', 0.001, 0, True),
+	0x90: ('ms', 1, 0, True),
+	0x96: ('*C', 0.1, 0, True),
+	0x9C: ('*', 0.01, 0, True),
+	0x9D: ('*', 0.5, 0, True),
+	0xA8: ('g/s', 1, 0, True),
+	0xA9: ('Pa/s', 0.25, 0, True),
+	0xAD: ('mg/stroke', 0.01, 0, True),
+	0xAE: ('mg/stroke', 0.1, 0, True),
+	0xAF: ('%', 0.01, 0, True),
+	0xB0: ('%', 0.003052, 0, True),
+	0xB1: ('mV/s', 2, 0, True),
+	0xFD: ('kPa (absolute)', 0.001, 0, True),
+	0xFE: ('kPa (vacuum)', 0.25, 0, True),
+}
+
+# Monitor IDs come in families of one per bank or sensor, so build the names
+# once here rather than typing out all of them.
+__monitors = {
+	0x39: 'EVAP Monitor (Cap Off / 0.150")',
+	0x3A: 'EVAP Monitor (0.090")',
+	0x3B: 'EVAP Monitor (0.040")',
+	0x3C: 'EVAP Monitor (0.020")',
+	0x3D: 'Purge Flow Monitor',
+	0xA1: 'Misfire Monitor General Data',
+}
+
+for bank in range(4):
+	for sensor in range(4):
+		__monitors[0x01 + bank * 4 + sensor] = 'Oxygen Sensor Monitor Bank %d - Sensor %d' % (bank + 1, sensor + 1)
+		__monitors[0x41 + bank * 4 + sensor] = 'Oxygen Sensor Heater Monitor Bank %d - Sensor %d' % (bank + 1, sensor + 1)
+	__monitors[0x21 + bank] = 'Catalyst Monitor Bank %d' % (bank + 1)
+	__monitors[0x31 + bank] = 'EGR Monitor Bank %d' % (bank + 1)
+	__monitors[0x35 + bank] = 'VVT Monitor Bank %d' % (bank + 1)
+	__monitors[0x61 + bank] = 'Heated Catalyst Monitor Bank %d' % (bank + 1)
+	__monitors[0x71 + bank] = 'Secondary Air Monitor %d' % (bank + 1)
+	__monitors[0x81 + bank] = 'Fuel System Monitor Bank %d' % (bank + 1)
+	__monitors[0x85 + bank] = 'Boost Pressure Control Monitor Bank %d' % (bank + 1)
+
+for bank in range(2):
+	__monitors[0x90 + bank] = 'NOx Adsorber Monitor Bank %d' % (bank + 1)
+	__monitors[0x98 + bank] = 'NOx Catalyst Monitor Bank %d' % (bank + 1)
+	__monitors[0xB0 + bank] = 'PM Filter Monitor Bank %d' % (bank + 1)
+
+for cylinder in range(12):
+	__monitors[0xA2 + cylinder] = 'Misfire Cylinder %d Data' % (cylinder + 1)
+
+def monitorName(mid):
+	"""
+	Return a description of a Monitor ID.
+	"""
+	return __monitors.get(mid, 'Unknown Monitor %02X' % mid)
+
+def scale(uasid, raw):
+	"""
+	Scale a raw 16 bit value according to its Unit And Scaling ID, returning
+	(value, units). Unknown UASIDs are returned raw, with no units.
+	"""
+	units, factor, offset, signed = __uas.get(uasid, ('', 1, 0, False))
+	if signed and raw & 0x8000:
+		raw -= 0x10000
+	return raw * factor + offset, units
+
+def decodeSupported(messages):
+	"""
+	Decode the support bitmaps (MIDs 00, 20, 40...) from the messages of a
+	Mode 06 response.
+
+	Returns a sorted list of supported MIDs, from every ECU that responded.
+	"""
+	supported = set()
+	for msg in messages:
+		if len(msg) < 1 or msg[0] != 0x46:
+			continue
+		for pos in range(1, len(msg) - 4, 5):
+			base = msg[pos]
+			flags = (msg[pos+1] << 24) | (msg[pos+2] << 16) | (msg[pos+3] << 8) | msg[pos+4]
+			for flag in range(31, -1, -1):
+				# the last bit just says the next bitmap is supported
+				if flags & (1 << flag) and flag != 0:
+					supported.add((32-flag) + base)
+
+	return sorted(supported)
+
+def decodeResults(messages):
+	"""
+	Decode the test results from the messages of a Mode 06 response.
+
+	Returns a list of MonitorResult.
+	"""
+	ret = []
+	for msg in messages:
+		if len(msg) < 1 or msg[0] != 0x46:
+			continue
+		for pos in range(1, len(msg) - 8, 9):
+			mid, tid, uasid = msg[pos:pos+3]
+			value, units = scale(uasid, (msg[pos+3] << 8) | msg[pos+4])
+			lower = scale(uasid, (msg[pos+5] << 8) | msg[pos+6])[0]
+			upper = scale(uasid, (msg[pos+7] << 8) | msg[pos+8])[0]
+			ret.append(MonitorResult(mid, monitorName(mid), tid, value, lower,
+					upper, units, lower <= value <= upper))
+
+	return ret
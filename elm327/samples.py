@@ -0,0 +1,102 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# Compact sample records for high-rate polling.
+#
+# fetchLiveData() builds a new dictionary for every sample, copying the name
+# and units in from the PID table each time. A Sample only has four slots and
+# refers back to the PID table for the name and units, and the fetchSample()
+# and fetchSamples() calls can fill in existing Samples rather than making new
+# ones - so a polling loop can reuse the same buffer forever.
+
+import re
+import pids
+
+pidlist = pids.__pids
+
+class Sample(object):
+	"""
+	A single decoded value. meta is the PID's entry in the PID table, shared
+	by every Sample of that PID.
+	"""
+	__slots__ = ('pid', 'value', 'time', 'meta')
+
+	def __init__(self, pid=None, value=None, time=None, meta=None):
+		self.pid = pid
+		self.value = value
+		self.time = time
+		self.meta = meta
+
+	@property
+	def name(self):
+		return self.meta['Name']
+
+	@property
+	def units(self):
+		return self.meta['Units']
+
+	def __repr__(self):
+		return 'Sample(0x%02X, %r, %r)' % (self.pid or 0, self.value, self.time)
+
+def allocate(n):
+	"""
+	Return a list of n empty Samples, for passing to fetchSamples().
+	"""
+	return [Sample() for i in range(n)]
+
+# The patterns in the PID table expect the trailing space the ELM327 leaves on
+# each line; query() strips it, so compile versions without it. This is done
+# once here so the read path never has to look patterns up in re's cache.
+__patterns = dict()
+for mode, table in pidlist.items():
+	__patterns[mode] = dict()
+	for pid, entry in table.items():
+		__patterns[mode][pid] = re.compile(entry['Pattern'].replace(' $', '$'))
+
+def pattern(mode, pid):
+	"""
+	Return the compiled pattern for a PID, which matches a stripped line.
+	"""
+	return __patterns[mode][pid]
+
+# Data that's already been parsed into bytes (batched requests, multi-frame
+# responses) is decoded straight from the bytes the pattern would capture,
+# rather than being turned back into text for the pattern to match.
+def __byteDecoder(decode, positions):
+	if positions == [0]:
+		return lambda data: decode(data[0])
+	if positions == [0, 1]:
+		return lambda data: decode(data[0], data[1])
+	return lambda data: decode(*[data[i] for i in positions])
+
+__decoders = dict()
+for mode, table in pidlist.items():
+	__decoders[mode] = dict()
+	for pid, entry in table.items():
+		tokens = entry['Pattern'].strip('^$ ').split(' ')[2:] # skip mode, PID
+		positions = [i for i in range(len(tokens)) if tokens[i].startswith('(')]
+		__decoders[mode][pid] = __byteDecoder(entry['Decode'], positions)
+
+def decoder(mode, pid):
+	"""
+	Return a function that decodes a PID's value from its data bytes (the
+	ints after the mode and PID). It raises IndexError if there are too few.
+	"""
+	return __decoders[mode][pid]
+
+__requests = {0: dict(), 1: dict()}
+for pid in pidlist[0x01]:
+	__requests[0][pid] = '01%02X' % pid
+	__requests[1][pid] = '01%02X1' % pid
+
+def request(pid, hint=1):
+	"""
+	Return the Mode 01 request string for a PID, with the response count hint
+	unless hint is zero.
+	"""
+	return __requests[hint][pid]
@@ -0,0 +1,239 @@
+"""
+Python module presenting an API to an ELM327 serial interface
+(C) 2015 Jamie Fraser <fwaggle@fwaggle.org>
+http://github.com/fwaggle/pyELM327
+
+Please see License.txt and Readme.md.
+"""
+
+# Shared-memory latest-value table.
+#
+# The logging process publishes the latest decoded value of each PID into a
+# memory-mapped file, and any number of other processes (dashboards etc.) poll
+# it directly - reading a value is a couple of memory reads, no sockets, no
+# serialisation and no syscalls once the file is mapped.
+#
+# Layout (little endian):
+#
+#	header:	'ELMV' magic, uint16 version, uint16 slot count, uint32 flags,
+#		4 bytes padding
+#	slots:	uint32 sequence, uint32 PID, double value, double timestamp
+#
+# Each slot is a seqlock: the writer bumps the sequence to an odd number,
+# writes the value and timestamp, then bumps it to the next even number.
+# Readers retry if the sequence was odd or changed underneath them.
+#
+# A restarted publisher writes a new file over the path, and readers still
+# mapping the old one would never know - so the RETIRED flag is set in the
+# old table when its publisher closes or is replaced, and readers check it on
+# every read.
+
+import mmap, os, struct, time, numbers
+import pids
+
+pidlist = pids.__pids
+
+MAGIC = b'ELMV'
+VERSION = 2
+
+HEADER = struct.Struct('<4sHHI4x')
+FLAGS = struct.Struct('<I') # 8 bytes into the header
+RETIRED = 0x01
+SLOT = struct.Struct('<IIdd')
+SEQ = struct.Struct('<I') # first field of a slot
+DATA = struct.Struct('<dd') # value and timestamp, 8 bytes into a slot
+
+NAN = float('nan')
+
+class Publisher(object):
+	"""
+	Writes the latest value for each PID into a memory-mapped file.
+
+	By default there's a slot for every Mode 01 PID the library knows about.
+	Values that aren't numeric ('NO DATA', decoded status strings) are
+	published as NaN, with the timestamp still updated.
+	"""
+
+	def __init__(self, path, pids=None):
+		if pids == None:
+			pids = sorted(pidlist[0x01])
+		self.pids = list(pids)
+		self.path = path
+
+		size = HEADER.size + SLOT.size * len(self.pids)
+
+		# Build the table in a new file and rename it into place, rather than
+		# truncating the old one - readers that already have the old table
+		# mapped keep it, and new readers never see a half-written header.
+		tmp = '%s.%d.tmp' % (path, os.getpid())
+		f = open(tmp, 'w+b')
+		f.write(b'\0' * size)
+		f.flush()
+		self.__mm = mmap.mmap(f.fileno(), size)
+		f.close()
+
+		self.__offsets = dict()
+		HEADER.pack_into(self.__mm, 0, MAGIC, VERSION, len(self.pids), 0)
+		for i, pid in enumerate(self.pids):
+			offset = HEADER.size + SLOT.size * i
+			SLOT.pack_into(self.__mm, offset, 0, pid, NAN, 0.0)
+			self.__offsets[pid] = offset
+		self.__mm.flush()
+
+		# hold on to whatever was there so it can be retired once readers
+		# reopening the path will find the new table
+		try:
+			old = open(path, 'r+b')
+		except IOError:
+			old = None
+		os.rename(tmp, path)
+		if old != None:
+			try:
+				retire(old)
+			finally:
+				old.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exception_type, exception_value, traceback):
+		self.close()
+
+	def update(self, pid, value, t=None):
+		"""
+		Publish a value for a PID. PIDs without a slot are ignored.
+		"""
+		offset = self.__offsets.get(pid)
+		if offset == None:
+			return
+		if t == None:
+			t = time.time()
+		if not isinstance(value, numbers.Real):
+			value = NAN
+
+		mm = self.__mm
+		seq = SEQ.unpack_from(mm, offset)[0]
+		SEQ.pack_into(mm, offset, (seq + 1) & 0xFFFFFFFF)
+		DATA.pack_into(mm, offset + 8, value, t)
+		SEQ.pack_into(mm, offset, (seq + 2) & 0xFFFFFFFF)
+
+	def publish(self, sample, t=None):
+		"""
+		Publish a sample, either a dictionary from fetchLiveData() or a
+		samples.Sample, whose own timestamp is used unless t is given.
+		"""
+		if isinstance(sample, dict):
+			self.update(sample['pid'], sample['value'], t)
+		else:
+			self.update(sample.pid, sample.value, sample.time if t == None else t)
+
+	def close(self):
+		"""
+		Stop publishing. The table is marked as retired, so readers raise
+		rather than carry on showing the last values forever.
+		"""
+		flags = FLAGS.unpack_from(self.__mm, 8)[0]
+		FLAGS.pack_into(self.__mm, 8, flags | RETIRED)
+		self.__mm.close()
+
+def retire(f):
+	"""
+	Mark the table in an open file as retired, if it is one.
+	"""
+	try:
+		mm = mmap.mmap(f.fileno(), 0)
+	except (mmap.error, ValueError):
+		return # empty file
+	try:
+		if mm.size() >= HEADER.size:
+			magic, version, count, flags = HEADER.unpack_from(mm, 0)
+			if magic == MAGIC and version == VERSION:
+				FLAGS.pack_into(mm, 8, flags | RETIRED)
+	finally:
+		mm.close()
+
+class Reader(object):
+	"""
+	Polls a table written by Publisher, from any process.
+
+	The slot layout is read from the file header when it's opened, so the
+	reader doesn't need the same PID list as the publisher. If the publisher
+	is restarted, the reader switches to the new table on its next read.
+	"""
+
+	def __init__(self, path, retries=100):
+		self.retries = retries
+		self.path = path
+		self.__mm = None
+		self.__open()
+
+	def __open(self):
+		f = open(self.path, 'rb')
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		f.close()
+
+		magic, version, count, flags = HEADER.unpack_from(mm, 0)
+		if magic != MAGIC or version != VERSION:
+			mm.close()
+			raise Exception('Not a pyELM327 value table: %s' % self.path)
+
+		if self.__mm != None:
+			self.__mm.close()
+		self.__mm = mm
+
+		self.pids = []
+		self.__offsets = dict()
+		for i in range(count):
+			offset = HEADER.size + SLOT.size * i
+			pid = SLOT.unpack_from(self.__mm, offset)[1]
+			self.pids.append(pid)
+			self.__offsets[pid] = offset
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exception_type, exception_value, traceback):
+		self.close()
+
+	def read(self, pid):
+		"""
+		Return (value, timestamp) for a PID. The timestamp is 0 if nothing's
+		been published for it yet.
+
+		Raises KeyError if the table has no slot for the PID, and an exception
+		if the publisher has closed without another taking over.
+		"""
+		if FLAGS.unpack_from(self.__mm, 8)[0] & RETIRED:
+			self.__reopen()
+
+		offset = self.__offsets.get(pid)
+		if offset == None:
+			raise KeyError('No slot for PID 0x%02x' % pid)
+
+		mm = self.__mm
+		for i in range(self.retries):
+			before = SEQ.unpack_from(mm, offset)[0]
+			if before & 1:
+				continue # write in progress
+			value, t = DATA.unpack_from(mm, offset + 8)
+			if SEQ.unpack_from(mm, offset)[0] == before:
+				return value, t
+
+		raise Exception('Couldn\'t get a consistent read for PID 0x%02x' % pid)
+
+	def snapshot(self):
+		"""
+		Return a dictionary of PID -> (value, timestamp) for every slot.
+		"""
+		if FLAGS.unpack_from(self.__mm, 8)[0] & RETIRED:
+			self.__reopen()
+		return dict((pid, self.read(pid)) for pid in self.pids)
+
+	def __reopen(self):
+		# a restarted publisher has renamed a new table into place
+		self.__open()
+		if FLAGS.unpack_from(self.__mm, 8)[0] & RETIRED:
+			raise Exception('Value table closed by its publisher: %s' % self.path)
+
+	def close(self):
+		self.__mm.close()
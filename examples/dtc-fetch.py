@@ -10,10 +10,17 @@ with elm327.ELM327('/dev/ttyUSB0', debug=0) as elm:
 	Hopefully will print all Diagnostic Trouble Codes stored on the ECU. Some 
 	manufacturers are shady with this stuff so it doesn't always work.
 
-	The fetchDTCs() function's output is subject to change, eventually it
-	will return a list of the DTCs and it will be up to the caller to print.
+	fetchAllDTCs() returns the MIL status along with stored, pending and
+	permanent codes from every ECU that responds.
 	"""
-	print elm.fetchDTCs()
+	report = elm.fetchAllDTCs()
+	if report == None:
+		print "NO DATA"
+	else:
+		print ("CEL: %d DTC Count: %d" % (report.status.mil, report.status.count))
+		print ("Stored: %s" % ', '.join(report.stored))
+		print ("Pending: %s" % ', '.join(report.pending))
+		print ("Permanent: %s" % ', '.join(report.permanent))
 
 
 	"""
@@ -1,41 +1,38 @@
 #! /usr/bin/python
 
-import time, sys
+# Show every supported live data PID, refreshing as fast as the bus allows.
+#
+# To log live data to disk rather than watch it, use the command line logger
+# instead - it does per-PID rates, rotation and so on:
+#
+#	python -m elm327.logger /dev/ttyUSB0 --pids 0C,0D,05 --rate 1,0C=20,0D=5
+
+import sys
 sys.path.append(".")
 sys.path.append("..")
-from elm327 import elm327, pids
+from elm327 import elm327, samples
 
 with elm327.ELM327('/dev/ttyUSB0', debug=0) as elm:
-	# Attempt to set a higher baud. Note that this will, when the script is
-	# stopped with CTRL+C, leave the ELM327 in a semi-usable state - it will
-	# still be configured to use the higher baud rate!
-
-	# So next time around you'll have to either initialize the ELM327 object
-	# with baud=500000, or simply reset the device by unplugging it and
-	# plugging it back in. Or, simply comment this line out, because at the
-	# time of writing we don't run out of bandwidth for the speed we're
-	# polling the PIDs at.
-	#elm.tryBaudrate(500000)
+	# Switch on whichever fast paths the adapter can manage, such as several
+	# PIDs per request on CAN.
+	elm.probeCapabilities()
 
 	print("Device reports as: %s @ %d bps" % (elm.id, elm.baudrate))
 
-	supported = elm.fetchSupportedPIDsLive()
-	if supported == None:
-		elm.write('ATZ')
-		exit()
+	supported = sorted([int(spid, 16) for spid in elm.fetchSupportedPIDsLive()])
+	if not supported:
+		print("No live data PIDs supported.")
+		sys.exit(1)
+
+	# One buffer, refilled every time round
+	buf = samples.allocate(len(supported))
 
-	while True:
-		print("\033[6;3H")
-		# Iteratively fetch all PIDs in Mode 01
-		for spid in supported:
-			pid = int(spid, 16)
-			try:
-				res = elm.fetchLiveData(pid)
-				if res:
-					print("%s: %s %s" % (res['name'], res['value'], res['units']))
-			except Exception as e:
-				if e == 'STOPPED':
-					elm.reset(1) # warm reset, keep baud rate.
-					time.sleep(1) # wait 1 second before trying again.
-				else:
-					print e
+	try:
+		while True:
+			print("\033[6;3H")
+			# 'STOPPED' and dropped connections are recovered from by the
+			# library, see elm.metrics for how often that happened.
+			for sample in elm.fetchSamples(supported, buf):
+				print("%s: %s %s\033[K" % (sample.name, sample.value, sample.units))
+	except KeyboardInterrupt:
+		pass
@@ -12,13 +12,8 @@ with elm327.ELM327('/dev/ttyUSB0') as elm:
 	# Alternate between showing engine RPM and throttle position forever
 	# until CTRL+C is pressed or unit is unplugged.	
 	while True:
+		# 'STOPPED' and unplugging/replugging the device are recovered from
+		# automatically - see elm.metrics for how long that took.
 		for pid in [0x0c, 0x11]:
-			try:
-				data = elm.fetchLiveData(pid)
-			except Exception as e:
-				if e == 'STOPPED':
-					elm.reset()
-				else:
-					raise e
-			else:
-				print("%s: %5.2f" % (data['name'], data['value']))
+			data = elm.fetchLiveData(pid)
+			print("%s: %5.2f" % (data['name'], data['value']))